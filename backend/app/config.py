@@ -61,7 +61,9 @@ def _build_settings() -> Settings:
     # Fix relative SQLite path to be absolute from backend dir
     if s.is_sqlite and ":///" in s.DATABASE_URL:
         db_path = s.DATABASE_URL.split(":///", 1)[1]
-        if not os.path.isabs(db_path):
+        # In-memory databases (":memory:", "file::memory:?cache=shared") have no path
+        in_memory = ":memory:" in db_path or "mode=memory" in db_path
+        if not os.path.isabs(db_path) and not in_memory:
             abs_path = str(_BACKEND_DIR / db_path)
             s.DATABASE_URL = f"sqlite+aiosqlite:///{abs_path}"
     # Fix relative MEDIA_DIR
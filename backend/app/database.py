@@ -3,7 +3,7 @@
 import sys
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 
 from app.config import settings
 
@@ -27,11 +27,45 @@ if not settings.is_sqlite:
 
 sync_engine = create_engine(settings.sync_database_url, **_sync_kw)
 
+# File-backed SQLite: WAL lets the API read while the scraper writes, and
+# synchronous=NORMAL drops the fsync on every commit (still durable under
+# WAL on application crash). In-memory databases have no journal to tune.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+if settings.is_sqlite and ":memory:" not in settings.DATABASE_URL \
+        and "mode=memory" not in settings.DATABASE_URL:
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def upsert_insert(table):
+    """Return an INSERT for the configured backend that supports ``on_conflict_do_update``."""
+    if settings.is_sqlite:
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(table)
+
+
 async def get_db() -> AsyncSession:
     """Dependency that yields an async database session."""
     async with AsyncSessionLocal() as session:
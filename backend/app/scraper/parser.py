@@ -7,6 +7,12 @@ from bs4 import BeautifulSoup
 
 logger = logging.getLogger(__name__)
 
+# Icons, logos and placeholder images, matched in one pass over the URL
+_NON_PHOTO_RE = re.compile(
+    r"logo|icon|placeholder|spinner|loading|pixel|spacer|blank|widget|badge|1x1",
+    re.IGNORECASE,
+)
+
 
 def parse_listing_page(html: str) -> List[Dict[str, str]]:
     """
@@ -257,12 +263,7 @@ def _extract_photos(soup: BeautifulSoup) -> List[str]:
             continue
 
         # Filter out icons, logos, placeholder images
-        src_lower = src.lower()
-        if any(skip in src_lower for skip in [
-            "logo", "icon", "placeholder", "spinner", "loading",
-            "pixel", "spacer", "blank", "widget", "badge",
-            "1x1", "favicon",
-        ]):
+        if _NON_PHOTO_RE.search(src):
             continue
 
         # Normalize URL
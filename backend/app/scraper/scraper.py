@@ -5,7 +5,7 @@ import hashlib
 import logging
 import os
 from pathlib import Path
-from typing import Callable, Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from urllib.parse import urljoin
 
 import httpx
@@ -40,8 +40,36 @@ class AutoAvenueScaper:
         self.delay_max = settings.SCRAPE_DELAY_MAX
         self.max_retries = settings.SCRAPE_MAX_RETRIES
         self.progress_callback = progress_callback
+        self.errors: List[str] = []
         self._browser: Optional[Browser] = None
         self._context: Optional[BrowserContext] = None
+        self._http: httpx.AsyncClient | None = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the image HTTP client, creating it on first use.
+
+        The client is kept for the scraper's lifetime so keep-alive
+        connections and TLS sessions to the image CDN are reused.
+        """
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=30.0,
+                follow_redirects=True,
+                headers={"User-Agent": get_random_user_agent()},
+            )
+        return self._http
+
+    async def aclose(self):
+        """Close the image HTTP client."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     async def _report_progress(self, **kwargs):
         """Report progress to the callback if set."""
@@ -127,14 +155,16 @@ class AutoAvenueScaper:
             base_delay=3.0,
         )
 
-    async def scrape_inventory(self) -> List[Dict]:
+    async def scrape_inventory(self) -> AsyncIterator[List[Dict]]:
         """
         Scrape all vehicle listings from the inventory pages.
 
-        Returns a list of vehicle data dicts with all specs and photos.
+        Yields one batch of vehicle data dicts (with all specs and photos)
+        per listing page, as soon as that page's detail pages are scraped.
+        Errors are collected on ``self.errors``.
         """
-        all_vehicles: List[Dict] = []
-        errors: List[str] = []
+        errors = self.errors = []
+        vehicles_found = 0
 
         try:
             await self.start_browser()
@@ -170,6 +200,7 @@ class AutoAvenueScaper:
                     break
 
                 # Visit each vehicle detail page
+                page_vehicles: List[Dict] = []
                 for idx, stub in enumerate(stubs):
                     detail_url = stub.get("detail_url", "")
                     if not detail_url:
@@ -183,7 +214,7 @@ class AutoAvenueScaper:
 
                     await self._report_progress(
                         message=f"Page {current_page_num}: Scraping vehicle {idx + 1}/{len(stubs)}",
-                        vehicles_found=len(all_vehicles),
+                        vehicles_found=vehicles_found + len(page_vehicles),
                     )
 
                     await random_delay(self.delay_min, self.delay_max)
@@ -193,7 +224,7 @@ class AutoAvenueScaper:
                         vehicle_data = parse_vehicle_detail(detail_html, detail_url)
 
                         if vehicle_data.get("vin"):
-                            all_vehicles.append(vehicle_data)
+                            page_vehicles.append(vehicle_data)
                             logger.info(
                                 f"Scraped: {vehicle_data.get('year')} "
                                 f"{vehicle_data.get('make')} {vehicle_data.get('model')} "
@@ -207,6 +238,10 @@ class AutoAvenueScaper:
                         logger.error(error_msg)
                         errors.append(error_msg)
 
+                if page_vehicles:
+                    vehicles_found += len(page_vehicles)
+                    yield page_vehicles
+
                 # Check for next page
                 next_url = find_next_page_url(html)
                 if next_url:
@@ -223,15 +258,13 @@ class AutoAvenueScaper:
             await self._report_progress(
                 current_page=current_page_num,
                 total_pages=current_page_num,
-                vehicles_found=len(all_vehicles),
+                vehicles_found=vehicles_found,
                 message="Listing scrape complete.",
             )
 
         finally:
             await self.stop_browser()
 
-        return all_vehicles, errors
-
     async def download_vehicle_images(self, vin: str, photo_urls: List[str]) -> List[str]:
         """
         Download vehicle images to media/{vin}/ directory.
@@ -246,38 +279,38 @@ class AutoAvenueScaper:
         vin_dir.mkdir(parents=True, exist_ok=True)
 
         local_paths = []
-        async with httpx.AsyncClient(
-            timeout=30.0,
-            follow_redirects=True,
-            headers={"User-Agent": get_random_user_agent()},
-        ) as client:
-            for idx, url in enumerate(photo_urls):
-                try:
-                    response = await client.get(url)
-                    response.raise_for_status()
-
-                    img_bytes = response.content
-
-                    # Determine file extension
-                    content_type = response.headers.get("content-type", "")
-                    ext = ".jpg"
-                    if "png" in content_type:
-                        ext = ".png"
-                    elif "webp" in content_type:
-                        ext = ".webp"
-
-                    # Detect and remove dealer frame overlay
-                    if ext == ".jpg" and has_dealer_frame(img_bytes):
-                        img_bytes = remove_dealer_frame(img_bytes)
-                        logger.info(f"Removed dealer frame from {vin} photo {idx}")
-
-                    filename = f"{idx:03d}{ext}"
-                    filepath = vin_dir / filename
-                    filepath.write_bytes(img_bytes)
-                    local_paths.append(f"/media/{vin}/{filename}")
-
-                except Exception as e:
-                    logger.warning(f"Failed to download image {url}: {e}")
+        client = self._get_http_client()
+        for idx, url in enumerate(photo_urls):
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+
+                img_bytes = response.content
+
+                # Determine file extension
+                content_type = response.headers.get("content-type", "")
+                ext = ".jpg"
+                if "png" in content_type:
+                    ext = ".png"
+                elif "webp" in content_type:
+                    ext = ".webp"
+
+                # Detect and remove dealer frame overlay
+                if ext == ".jpg" and has_dealer_frame(img_bytes):
+                    img_bytes = remove_dealer_frame(img_bytes)
+                    logger.info(f"Removed dealer frame from {vin} photo {idx}")
+
+                filename = f"{idx:03d}{ext}"
+                filepath = vin_dir / filename
+                # Write beside the target and swap it in, so readers never
+                # see a half-written photo
+                tmp = filepath.with_suffix(ext + ".part")
+                tmp.write_bytes(img_bytes)
+                os.replace(tmp, filepath)
+                local_paths.append(f"/media/{vin}/{filename}")
+
+            except Exception as e:
+                logger.warning(f"Failed to download image {url}: {e}")
 
         return local_paths
 
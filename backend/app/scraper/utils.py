@@ -79,22 +79,29 @@ def has_dealer_frame(img_bytes: bytes) -> bool:
 
     try:
         img = Image.open(BytesIO(img_bytes))
-        arr = np.array(img)
-        h, w = arr.shape[:2]
+        w, h = img.size
         if h < 100 or w < 100:
             return False
 
+        # Only coarse white-fraction statistics are needed, so let libjpeg
+        # decode at 1/8 scale (scaled IDCT) instead of full resolution
+        img.draft("RGB", (w // 8, h // 8))
+        arr = np.asarray(img, dtype=np.uint8)
+        h, w = arr.shape[:2]
+
         # Check top-left area for white/bright region (logo background)
-        tl_h, tl_w = int(h * 0.12), int(w * 0.30)
+        tl_h, tl_w = max(int(h * 0.12), 1), max(int(w * 0.30), 1)
         tl = arr[0:tl_h, 0:tl_w, :]
-        tl_white = np.sum(np.all(tl > 230, axis=2)) / (tl_h * tl_w) * 100
+        tl_white = np.count_nonzero(tl.min(axis=2) > 230) / (tl_h * tl_w) * 100
+        if tl_white <= 40:
+            return False
 
         # Check bottom-right area for white/bright region (URL bar)
-        br_h, br_w = int(h * 0.07), int(w * 0.50)
+        br_h, br_w = max(int(h * 0.07), 1), max(int(w * 0.50), 1)
         br = arr[-br_h:, -br_w:, :]
-        br_white = np.sum(np.all(br > 230, axis=2)) / (br_h * br_w) * 100
+        br_white = np.count_nonzero(br.min(axis=2) > 230) / (br_h * br_w) * 100
 
-        return tl_white > 40 and br_white > 30
+        return br_white > 30
     except Exception:
         return False
 
@@ -124,7 +131,9 @@ def remove_dealer_frame(img_bytes: bytes) -> bytes:
         cropped = img.crop((0, top_px, w, h - bot_px))
 
         out = BytesIO()
-        cropped.save(out, format="JPEG", quality=95)
+        # 4:2:0 matches what the CDN serves; no optimize/progressive passes
+        cropped.save(out, format="JPEG", quality=90, subsampling="4:2:0",
+                     optimize=False, progressive=False)
         return out.getvalue()
     except Exception:
         return img_bytes
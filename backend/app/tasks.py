@@ -1,17 +1,20 @@
 """Celery tasks for background scraping jobs."""
 
 import asyncio
-import json
+import contextlib
 import logging
 from datetime import datetime, timezone, timedelta
+from decimal import Decimal
 from typing import Optional
 
+import orjson
 from celery import Celery
 from celery.schedules import crontab
-from sqlalchemy import create_engine, select, update, func
+from sqlalchemy import JSON, Text, and_, bindparam, cast, create_engine, func, or_, select, update
 from sqlalchemy.orm import Session as SyncSession, sessionmaker
 
 from app.config import settings
+from app.database import upsert_insert
 from app.models import Vehicle, ScrapeLog, ScrapeStatus
 
 logger = logging.getLogger(__name__)
@@ -47,6 +50,26 @@ celery_app.conf.update(
 sync_engine = create_engine(settings.sync_database_url, pool_pre_ping=True)
 SyncSessionLocal = sessionmaker(bind=sync_engine)
 
+# Scraped fields that are copied onto an existing vehicle when they change
+VEHICLE_UPDATE_FIELDS = (
+    "stock_number", "year", "make", "model", "trim", "price",
+    "mileage", "exterior_color", "interior_color", "body_style",
+    "drivetrain", "engine", "transmission", "photos", "detail_url",
+)
+
+# Every column written from a scraped record, used as the row template
+VEHICLE_COLUMNS = ("vin", *VEHICLE_UPDATE_FIELDS)
+
+# Vehicle.price is Numeric(12, 2); scraped floats are converted to match
+PRICE_QUANTUM = Decimal("0.01")
+
+# Upper bound on photo entries stored per vehicle (local paths first)
+MAX_STORED_PHOTOS = 30
+
+# Scraped vehicles are upserted (and committed) in batches of this size while
+# scraping continues
+SYNC_BATCH_SIZE = 500
+
 
 def _get_redis():
     """Get a Redis client for progress reporting."""
@@ -60,14 +83,107 @@ def _update_progress(task_id: str, **kwargs):
         r = _get_redis()
         key = f"scrape_progress:{task_id}"
         data = r.get(key)
-        progress = json.loads(data) if data else {}
+        progress = orjson.loads(data) if data else {}
         progress.update(kwargs)
         progress["task_id"] = task_id
-        r.setex(key, 300, json.dumps(progress))  # TTL 5 min
+        r.setex(key, 300, orjson.dumps(progress))  # TTL 5 min
     except Exception as e:
         logger.warning(f"Failed to update progress in Redis: {e}")
 
 
+def _changed(column, new_value):
+    """SQL condition: a non-NULL scraped value differs from the stored one."""
+    if isinstance(column.type, JSON):
+        # json has no equality operator on PostgreSQL; compare the text form
+        column, new_value = cast(column, Text), cast(new_value, Text)
+    return and_(new_value.isnot(None), column.is_distinct_from(new_value))
+
+
+def _upsert_vehicles(db: SyncSession, vehicles: list[dict], scraped_vins: set) -> tuple[int, int]:
+    """Insert new and update changed vehicles from one scraped batch.
+
+    Uses a single ``INSERT ... ON CONFLICT (vin) DO UPDATE`` so change
+    detection happens server-side. VINs are added to ``scraped_vins``;
+    VINs already in it are skipped. Returns ``(new_count, updated_count)``.
+    Does not commit.
+    """
+    rows = []
+    for v_data in vehicles:
+        vin = v_data.get("vin")
+        if not vin or vin in scraped_vins:
+            continue
+        scraped_vins.add(vin)
+        row = {column: v_data.get(column) for column in VEHICLE_COLUMNS}
+        if row["photos"] is None:
+            row["photos"] = []
+        if row["price"] is not None:
+            # Stored prices come back as Decimal; a float never equals one
+            # with cents, which would defeat the unchanged-row filter below
+            row["price"] = Decimal(str(row["price"])).quantize(PRICE_QUANTUM)
+        row["is_active"] = True
+        rows.append(row)
+    if not rows:
+        return 0, 0
+
+    # Snapshot existing rows as plain tuples: a row whose scraped values are
+    # identical (and which is still active) is dropped from the upsert
+    # payload with a single tuple compare.
+    vehicles_table = Vehicle.__table__
+    existing = {
+        vin: tuple(values)
+        for vin, *values in db.execute(
+            select(
+                vehicles_table.c.vin,
+                vehicles_table.c.is_active,
+                *(vehicles_table.c[field] for field in VEHICLE_UPDATE_FIELDS),
+            ).where(vehicles_table.c.vin.in_([row["vin"] for row in rows]))
+        )
+    }
+    rows = [
+        row for row in rows
+        if existing.get(row["vin"]) != (True, *(row[field] for field in VEHICLE_UPDATE_FIELDS))
+    ]
+    if not rows:
+        return 0, 0
+
+    # Scraped NULLs keep the stored value; rows only count as updated (and
+    # get a new updated_at) when a field differs or the vehicle is reactivated.
+    stmt = upsert_insert(Vehicle).values(rows)
+    set_ = {
+        field: func.coalesce(stmt.excluded[field], vehicles_table.c[field])
+        for field in VEHICLE_UPDATE_FIELDS
+    }
+    set_["updated_at"] = func.now()
+    set_["is_active"] = True
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["vin"],
+        set_=set_,
+        where=or_(
+            vehicles_table.c.is_active.is_(False),
+            *(_changed(vehicles_table.c[field], stmt.excluded[field]) for field in VEHICLE_UPDATE_FIELDS),
+        ),
+    ).returning(vehicles_table.c.vin)
+
+    written = set(db.execute(stmt).scalars())
+    return len(written - existing.keys()), len(written & existing.keys())
+
+
+def _deactivate_missing(db: SyncSession, scraped_vins: set) -> int:
+    """Mark active vehicles that were not scraped as inactive. Does not commit."""
+    if not scraped_vins:
+        return 0
+    vehicles_table = Vehicle.__table__
+    result = db.execute(
+        update(vehicles_table)
+        .where(
+            vehicles_table.c.is_active == True,  # noqa: E712
+            vehicles_table.c.vin.not_in(scraped_vins),
+        )
+        .values(is_active=False, updated_at=func.now())
+    )
+    return result.rowcount
+
+
 @celery_app.task(bind=True, name="app.tasks.run_scrape", max_retries=1)
 def run_scrape(self, scheduled: bool = False):
     """
@@ -77,25 +193,22 @@ def run_scrape(self, scheduled: bool = False):
     task_id = self.request.id
     logger.info(f"Starting scrape task {task_id} (scheduled={scheduled})")
 
-    # Create scrape log entry
+    # Stage the scrape log in memory; it is persisted with the inactive sweep
+    # in the final commit. Live progress goes through Redis.
     db: SyncSession = SyncSessionLocal()
     log = ScrapeLog(
         task_id=task_id,
         status=ScrapeStatus.RUNNING,
         started_at=datetime.now(timezone.utc),
     )
-    db.add(log)
-    db.commit()
-    db.refresh(log)
-    log_id = log.id
 
     _update_progress(task_id, status="running", progress=5, message="Initializing scraper...")
 
-    try:
-        # Run the async scraper in a new event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    # A single event loop serves both the scrape and image download phases
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
 
+    try:
         from app.scraper.scraper import AutoAvenueScaper
 
         def progress_cb(**kwargs):
@@ -114,133 +227,115 @@ def run_scrape(self, scheduled: bool = False):
                 message=message,
             )
 
-        scraper = AutoAvenueScaper(progress_callback=progress_cb)
-        all_vehicles, scrape_errors = loop.run_until_complete(scraper.scrape_inventory())
-        loop.close()
-
-        _update_progress(task_id, progress=85, message="Syncing to database...")
-
-        # ── Sync scraped data to database ────────────────────────────────
-        scraped_vins = set()
-        new_count = 0
-        updated_count = 0
-
-        for v_data in all_vehicles:
-            vin = v_data.get("vin")
-            if not vin:
-                continue
-            scraped_vins.add(vin)
-
-            existing = db.execute(
-                select(Vehicle).where(Vehicle.vin == vin)
-            ).scalar_one_or_none()
-
-            if existing:
-                # Update existing vehicle
-                changed = False
-                for field in [
-                    "stock_number", "year", "make", "model", "trim", "price",
-                    "mileage", "exterior_color", "interior_color", "body_style",
-                    "drivetrain", "engine", "transmission", "photos", "detail_url",
-                ]:
-                    new_val = v_data.get(field)
-                    if new_val is not None and new_val != getattr(existing, field, None):
-                        setattr(existing, field, new_val)
-                        changed = True
-                if changed:
-                    existing.updated_at = datetime.now(timezone.utc)
-                    existing.is_active = True
-                    updated_count += 1
-            else:
-                # Insert new vehicle
-                vehicle = Vehicle(
-                    vin=vin,
-                    stock_number=v_data.get("stock_number"),
-                    year=v_data.get("year"),
-                    make=v_data.get("make"),
-                    model=v_data.get("model"),
-                    trim=v_data.get("trim"),
-                    price=v_data.get("price"),
-                    mileage=v_data.get("mileage"),
-                    exterior_color=v_data.get("exterior_color"),
-                    interior_color=v_data.get("interior_color"),
-                    body_style=v_data.get("body_style"),
-                    drivetrain=v_data.get("drivetrain"),
-                    engine=v_data.get("engine"),
-                    transmission=v_data.get("transmission"),
-                    photos=v_data.get("photos", []),
-                    detail_url=v_data.get("detail_url"),
-                    is_active=True,
-                )
-                db.add(vehicle)
-                new_count += 1
-
-        # Mark vehicles not found in scrape as inactive
-        removed_count = 0
-        if scraped_vins:
-            active_vehicles = db.execute(
-                select(Vehicle).where(Vehicle.is_active == True)  # noqa: E712
-            ).scalars().all()
-            for v in active_vehicles:
-                if v.vin not in scraped_vins:
-                    v.is_active = False
-                    v.updated_at = datetime.now(timezone.utc)
-                    removed_count += 1
-
-        db.commit()
-
-        # Download images in background (async)
-        _update_progress(task_id, progress=90, message="Downloading images...")
-
-        loop2 = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop2)
-
-        async def download_all_images():
-            from app.scraper.scraper import AutoAvenueScaper
-            scraper = AutoAvenueScaper()
-            for v_data in all_vehicles:
+        async def download_all_images(scraper, vehicles):
+            photo_updates = []
+            for v_data in vehicles:
                 vin = v_data.get("vin")
                 photos = v_data.get("photos", [])
                 if vin and photos:
                     try:
                         local_paths = await scraper.download_vehicle_images(vin, photos)
                         if local_paths:
-                            db.execute(
-                                update(Vehicle)
-                                .where(Vehicle.vin == vin)
-                                .values(photos=local_paths + photos)
-                            )
+                            # Dedupe (order-preserving) and cap so the JSON
+                            # column can't grow across repeated scrapes
+                            merged = list(dict.fromkeys(local_paths + photos))[:MAX_STORED_PHOTOS]
+                            photo_updates.append({"b_vin": vin, "b_photos": merged})
                     except Exception as e:
                         logger.warning(f"Image download failed for VIN {vin}: {e}")
-            db.commit()
+            if photo_updates:
+                vehicles_table = Vehicle.__table__
+                db.execute(
+                    update(vehicles_table)
+                    .where(vehicles_table.c.vin == bindparam("b_vin"))
+                    .values(photos=bindparam("b_photos"), updated_at=func.now()),
+                    photo_updates,
+                )
 
-        try:
-            loop2.run_until_complete(download_all_images())
-        except Exception as e:
-            logger.warning(f"Image download phase failed: {e}")
-        finally:
-            loop2.close()
-
-        # Update scrape log
-        scrape_log = db.get(ScrapeLog, log_id)
-        scrape_log.status = ScrapeStatus.COMPLETED
-        scrape_log.finished_at = datetime.now(timezone.utc)
-        scrape_log.vehicles_found = len(all_vehicles)
-        scrape_log.vehicles_new = new_count
-        scrape_log.vehicles_updated = updated_count
-        scrape_log.vehicles_removed = removed_count
-        scrape_log.errors = scrape_errors
-        scrape_log.log_output = (
-            f"Scrape completed. Found {len(all_vehicles)} vehicles. "
+        async def main_async():
+            # Pages stream into a bounded queue; a separate consumer task
+            # upserts and downloads images for each batch while the browser
+            # keeps scraping. Each batch commits on its own so no write
+            # transaction (SQLite's database lock) spans the whole scrape,
+            # and memory stays O(SYNC_BATCH_SIZE).
+            scraped_vins = set()
+            found = new_count = updated_count = 0
+            queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+            async def consume():
+                nonlocal new_count, updated_count
+                while (batch := await queue.get()) is not None:
+                    new, updated = _upsert_vehicles(db, batch, scraped_vins)
+                    db.commit()
+                    new_count += new
+                    updated_count += updated
+                    try:
+                        await download_all_images(scraper, batch)
+                        db.commit()
+                    except Exception as e:
+                        db.rollback()
+                        logger.warning(f"Image download phase failed: {e}")
+
+            async def put(batch):
+                # Fail fast if the consumer died instead of blocking on a
+                # queue nobody drains
+                putter = asyncio.ensure_future(queue.put(batch))
+                await asyncio.wait({putter, consumer}, return_when=asyncio.FIRST_COMPLETED)
+                if not putter.done():
+                    putter.cancel()
+                    consumer.result()
+
+            # One scraper (and its image HTTP client) serves the whole task
+            async with AutoAvenueScaper(progress_callback=progress_cb) as scraper:
+                consumer = asyncio.create_task(consume())
+                try:
+                    buffer = []
+                    # aclosing() runs the generator's cleanup (stop_browser)
+                    # even when put() raises out of the loop
+                    async with contextlib.aclosing(scraper.scrape_inventory()) as batches:
+                        async for batch in batches:
+                            found += len(batch)
+                            buffer.extend(batch)
+                            if len(buffer) >= SYNC_BATCH_SIZE:
+                                await put(buffer)
+                                buffer = []
+                    if buffer:
+                        await put(buffer)
+                    await put(None)
+                    await consumer
+                finally:
+                    if not consumer.done():
+                        consumer.cancel()
+                        await asyncio.gather(consumer, return_exceptions=True)
+
+            _update_progress(task_id, progress=90, message="Marking removed vehicles...")
+            removed_count = _deactivate_missing(db, scraped_vins)
+
+            return found, scraper.errors, (new_count, updated_count, removed_count)
+
+        vehicles_found, scrape_errors, (new_count, updated_count, removed_count) = (
+            loop.run_until_complete(main_async())
+        )
+
+        # Write the scrape log and the inactive sweep in one commit
+        log.status = ScrapeStatus.COMPLETED
+        log.finished_at = datetime.now(timezone.utc)
+        log.vehicles_found = vehicles_found
+        log.vehicles_new = new_count
+        log.vehicles_updated = updated_count
+        log.vehicles_removed = removed_count
+        log.errors = scrape_errors
+        log.log_output = (
+            f"Scrape completed. Found {vehicles_found} vehicles. "
             f"New: {new_count}, Updated: {updated_count}, Removed: {removed_count}."
         )
+        db.add(log)
         db.commit()
 
         _update_progress(
             task_id,
             status="completed",
             progress=100,
-            vehicles_found=len(all_vehicles),
+            vehicles_found=vehicles_found,
             vehicles_new=new_count,
             vehicles_updated=updated_count,
             message="Scrape completed successfully!",
@@ -248,12 +343,12 @@ def run_scrape(self, scheduled: bool = False):
 
         logger.info(
             f"Scrape task {task_id} completed. "
-            f"Found={len(all_vehicles)}, New={new_count}, "
+            f"Found={vehicles_found}, New={new_count}, "
             f"Updated={updated_count}, Removed={removed_count}"
         )
         return {
             "status": "completed",
-            "vehicles_found": len(all_vehicles),
+            "vehicles_found": vehicles_found,
             "vehicles_new": new_count,
             "vehicles_updated": updated_count,
             "vehicles_removed": removed_count,
@@ -262,17 +357,24 @@ def run_scrape(self, scheduled: bool = False):
     except Exception as e:
         logger.error(f"Scrape task {task_id} failed: {e}", exc_info=True)
 
-        # Update scrape log with failure
+        # End the main session's transaction first: on SQLite its pending
+        # writes hold the database lock and the fresh session below would
+        # fail with "database is locked". The fresh session keeps the main
+        # session's failed transaction state from poisoning the log insert.
         try:
-            scrape_log = db.get(ScrapeLog, log_id)
-            if scrape_log:
-                scrape_log.status = ScrapeStatus.FAILED
-                scrape_log.finished_at = datetime.now(timezone.utc)
-                scrape_log.errors = [str(e)]
-                scrape_log.log_output = f"Scrape failed: {e}"
-                db.commit()
+            db.rollback()
+            with SyncSessionLocal() as fail_db:
+                fail_db.add(ScrapeLog(
+                    task_id=task_id,
+                    status=ScrapeStatus.FAILED,
+                    started_at=log.started_at,
+                    finished_at=datetime.now(timezone.utc),
+                    errors=[str(e)],
+                    log_output=f"Scrape failed: {e}",
+                ))
+                fail_db.commit()
         except Exception:
-            pass
+            logger.exception(f"Failed to record failed scrape log for task {task_id}")
 
         _update_progress(
             task_id,
@@ -283,4 +385,6 @@ def run_scrape(self, scheduled: bool = False):
         raise
 
     finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
         db.close()
@@ -16,16 +16,33 @@ Real site: https://autoavenj.ebizautos.com/used-cars.aspx
 
 import argparse
 import asyncio
-import json
 import os
 import re
 import sys
 import time
 import random
+import operator
+import shutil
+import hashlib
+import multiprocessing
 import traceback
+import aiofiles
 import httpx
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:   # stdlib fallback: compact separators, bytes out
+    import json
+
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    _json_loads = json.loads
+
 # ── Environment ──────────────────────────────────────────────────────────────
 os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./autoavenue.db")
 os.environ.setdefault("REDIS_URL", "redis://localhost:6480/0")
@@ -33,9 +50,9 @@ os.environ.setdefault("CELERY_BROKER_URL", "redis://localhost:6480/0")
 os.environ.setdefault("CELERY_RESULT_BACKEND", "redis://localhost:6480/1")
 os.environ.setdefault("MEDIA_DIR", "./media")
 
-from app.database import AsyncSessionLocal, init_db          # noqa: E402
+from app.database import AsyncSessionLocal, init_db, upsert_insert  # noqa: E402
 from app.models import Vehicle, ScrapeLog, ScrapeStatus, VehiclePriceHistory, VehicleChangeLog  # noqa: E402
-from sqlalchemy import select                                 # noqa: E402
+from sqlalchemy import insert, select, update                 # noqa: E402
 from datetime import datetime, timezone                       # noqa: E402
 
 BASE = "https://autoavenj.ebizautos.com"
@@ -46,19 +63,54 @@ INVENTORY_URL = f"{BASE}/used-cars.aspx"
 INVENTORY_PAGINATED_URL = f"{BASE}/inventory.aspx?_vstatus=3&_used=true"
 MEDIA_DIR = Path("./media")
 MEDIA_DIR.mkdir(exist_ok=True)
+LOCAL_PREFIXES = ("/media/",)   # photo URLs that point at downloaded files
 
 PROGRESS_DIR = Path(".scrape_progress")
 PROGRESS_DIR.mkdir(exist_ok=True)
 
+# Hot-path regexes, compiled once
+_PHOTO_RE = re.compile(r'-(\d{7,8})-(\d+)-(\d+)\.jpg')    # listing id, photo seq, resolution
+_YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+_TITLE_RE = re.compile(r'\d{4}\s+(\S+)\s+(\S+)\s*(.*)')
+_NON_DIGIT_DOT_RE = re.compile(r'[^\d.]')
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_HIRES_RE = re.compile(r'-(\d+)\.jpg$')
+
+# Max photos downloaded concurrently for a single vehicle
+PHOTO_CONCURRENCY = 8
+
+# Playwright pages scraping detail pages in parallel
+DETAIL_WORKERS = 4
+
+# Vehicles per multi-row upsert statement (keeps bind params well under
+# SQLite's per-statement limit)
+UPSERT_BATCH_SIZE = 500
+
 
 # ── Progress helper ──────────────────────────────────────────────────────────
 
+def _flush_output():
+    """Push buffered log lines out; called once per page / vehicle."""
+    sys.stdout.flush()
+
+
 class ProgressWriter:
-    """Writes live progress to a JSON file that the API reads."""
+    """Writes live progress to a JSON file that the API reads.
+
+    Writes go through a temp file + ``os.replace`` so the API never reads a
+    half-written file. The state dict is kept and updated in place; writes
+    are coalesced to at most one per ``MIN_FLUSH_INTERVAL`` seconds, except
+    terminal states and ``force=True`` updates (a step that is about to go
+    quiet for a while), which always flush. Payloads are serialised
+    straight to compact bytes (orjson, or stdlib json without whitespace).
+    """
+
+    MIN_FLUSH_INTERVAL = 0.5
 
     def __init__(self, task_id: str | None):
         self.task_id = task_id
         self._path = PROGRESS_DIR / f"{task_id}.json" if task_id else None
+        self._last_flush = 0.0
         self._data = {
             "task_id": task_id,
             "status": "running",
@@ -71,16 +123,24 @@ class ProgressWriter:
             "message": "Initialising...",
         }
 
-    def update(self, **kwargs):
+    def update(self, force: bool = False, **kwargs):
         self._data.update(kwargs)
-        self._flush()
+        self._flush(force)
 
-    def _flush(self):
-        if self._path:
-            try:
-                self._path.write_text(json.dumps(self._data))
-            except OSError:
-                pass
+    def _flush(self, force: bool = False):
+        if not self._path:
+            return
+        now = time.monotonic()
+        if (not force and now - self._last_flush < self.MIN_FLUSH_INTERVAL
+                and self._data.get("status") not in ("completed", "failed")):
+            return
+        self._last_flush = now
+        tmp = self._path.with_suffix(".json.tmp")
+        try:
+            tmp.write_bytes(_json_dumps(self._data))
+            os.replace(tmp, self._path)
+        except OSError:
+            pass
 
     @property
     def data(self):
@@ -89,6 +149,17 @@ class ProgressWriter:
 
 # ── Playwright helpers ───────────────────────────────────────────────────────
 
+# We only read the DOM and JSON-LD; photos are fetched separately via httpx
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
 async def launch_browser():
     from playwright.async_api import async_playwright
     pw = await async_playwright().start()
@@ -110,17 +181,28 @@ async def launch_browser():
         java_script_enabled=True,
         ignore_https_errors=True,
     )
+    await ctx.route("**/*", _block_heavy_resources)
+    await ctx.add_init_script(script=_EXTRACTORS_INIT_JS)
     return pw, browser, ctx
 
 
-async def navigate(page, url, retries=3):
-    """Navigate with retry."""
+async def navigate(page, url, ready_selector=None, retries=3):
+    """Navigate with retry.
+
+    When ``ready_selector`` is given, wait for that element to be attached
+    rather than for network idle — it's the data we actually read, and it
+    is usually there long before trackers stop firing. A page without it
+    is returned as-is after the timeout; the extractors handle missing data.
+    """
     for attempt in range(retries):
         try:
             print(f"  Navigating: {url}  (attempt {attempt+1})")
             await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            await page.wait_for_load_state("networkidle", timeout=30000)
-            await asyncio.sleep(1.5 + random.random())
+            if ready_selector:
+                try:
+                    await page.wait_for_selector(ready_selector, state="attached", timeout=15000)
+                except Exception:
+                    print(f"    Ready selector not found: {ready_selector}")
             return
         except Exception as e:
             print(f"    Navigation error: {e}")
@@ -135,7 +217,7 @@ async def navigate(page, url, retries=3):
 async def get_listing_vehicles_page(page, page_num: int = 1):
     """Extract vehicle data from a single inventory page using JSON-LD + links."""
     url = f"{INVENTORY_PAGINATED_URL}&_page={page_num}"
-    await navigate(page, url)
+    await navigate(page, url, ready_selector="#application-ld_json-vehicle")
 
     json_ld_text = await page.evaluate("""
         () => {
@@ -147,9 +229,9 @@ async def get_listing_vehicles_page(page, page_num: int = 1):
     vehicles_basic = []
     if json_ld_text:
         try:
-            data = json.loads(json_ld_text)
+            data = _json_loads(json_ld_text)
             vehicles_basic = data if isinstance(data, list) else [data]
-        except json.JSONDecodeError:
+        except ValueError:
             pass
 
     detail_links = await page.evaluate("""
@@ -204,6 +286,7 @@ async def get_all_listing_vehicles(page, max_pages: int = 1, progress: 'Progress
             progress.update(message=f"Loading inventory page {page_num}...", current_page=page_num)
 
         listings, has_next = await get_listing_vehicles_page(page, page_num)
+        _flush_output()
 
         # Deduplicate
         for item in listings:
@@ -226,86 +309,84 @@ async def get_all_listing_vehicles(page, max_pages: int = 1, progress: 'Progress
     return all_listings, page_num
 
 
-async def scrape_detail_page(page, detail_url):
-    """Navigate to a vehicle detail page and extract ALL specs + ALL photos."""
-    await navigate(page, detail_url)
-
-    vehicle_json = await page.evaluate("""
-        () => {
-            const scripts = document.querySelectorAll('script[type="application/ld+json"]');
-            for (const s of scripts) {
-                try {
-                    const data = JSON.parse(s.textContent);
-                    if (data['@type'] === 'Vehicle') return data;
-                } catch {}
-            }
-            return null;
+# Everything scrape_detail_page needs from the DOM, gathered in one CDP
+# round-trip instead of one evaluate per field. launch_browser() installs it
+# as an init script, so each page already has window.__extract compiled and
+# the per-page evaluate only ships a one-line call.
+_EXTRACTORS_INIT_JS = """
+    window.__extract = () => {
+        let vehicleJson = null;
+        for (const s of document.querySelectorAll('script[type="application/ld+json"]')) {
+            try {
+                const data = JSON.parse(s.textContent);
+                if (data['@type'] === 'Vehicle') { vehicleJson = data; break; }
+            } catch {}
         }
-    """)
 
-    specs = await page.evaluate("""
-        () => {
-            const result = {};
-            const rows = document.querySelectorAll('table tr');
-            for (const row of rows) {
-                const cells = row.querySelectorAll('td, th');
-                if (cells.length >= 2) {
-                    const label = cells[0].textContent.trim().replace(/[:#]/g, '').toLowerCase();
-                    const value = cells[1].textContent.trim();
-                    if (label && value && label.length < 40) result[label] = value;
-                }
+        const specs = {};
+        for (const row of document.querySelectorAll('table tr')) {
+            const cells = row.querySelectorAll('td, th');
+            if (cells.length >= 2) {
+                const label = cells[0].textContent.trim().replace(/[:#]/g, '').toLowerCase();
+                const value = cells[1].textContent.trim();
+                if (label && value && label.length < 40) specs[label] = value;
             }
-            const dts = document.querySelectorAll('dt');
-            for (const dt of dts) {
-                const dd = dt.nextElementSibling;
-                if (dd && dd.tagName === 'DD') {
-                    const label = dt.textContent.trim().replace(/[:#]/g, '').toLowerCase();
-                    const value = dd.textContent.trim();
-                    if (label && value) result[label] = value;
-                }
+        }
+        for (const dt of document.querySelectorAll('dt')) {
+            const dd = dt.nextElementSibling;
+            if (dd && dd.tagName === 'DD') {
+                const label = dt.textContent.trim().replace(/[:#]/g, '').toLowerCase();
+                const value = dd.textContent.trim();
+                if (label && value) specs[label] = value;
             }
-            return result;
         }
-    """)
 
-    raw_photo_urls = await page.evaluate("""
-        () => {
-            const urls = [];
-            const allEls = document.querySelectorAll('img, a[data-src], [data-image]');
-            for (const el of allEls) {
-                for (const attr of ['src', 'data-src', 'data-lazy', 'data-image']) {
-                    const val = el.getAttribute(attr);
-                    if (val && val.includes('ebizautos.media')) {
-                        let url = val;
-                        if (url.startsWith('//')) url = 'https:' + url;
-                        urls.push(url);
-                    }
+        const rawPhotoUrls = [];
+        for (const el of document.querySelectorAll('img, a[data-src], [data-image]')) {
+            for (const attr of ['src', 'data-src', 'data-lazy', 'data-image']) {
+                const val = el.getAttribute(attr);
+                if (val && val.includes('ebizautos.media')) {
+                    rawPhotoUrls.push(val.startsWith('//') ? 'https:' + val : val);
                 }
             }
-            return urls;
         }
-    """)
+
+        const h1 = document.querySelector('h1');
+        const title = h1 ? h1.textContent.trim() : '';
+
+        return { vehicleJson, specs, rawPhotoUrls, title };
+    };
+"""
+_DETAIL_EXTRACT_JS = "() => window.__extract()"
+
+
+async def scrape_detail_page(page, detail_url):
+    """Navigate to a vehicle detail page and extract ALL specs + ALL photos."""
+    await navigate(page, detail_url, ready_selector='script[type="application/ld+json"]')
+
+    data = await page.evaluate(_DETAIL_EXTRACT_JS)
+    vehicle_json = data["vehicleJson"]
+    specs = data["specs"]
+    raw_photo_urls = data["rawPhotoUrls"]
+    title = data["title"]
+
+    # Parse every photo URL once: (listing id, photo seq, resolution, url)
+    parsed_photos = []
+    for u in raw_photo_urls:
+        m = _PHOTO_RE.search(u)
+        if m:
+            parsed_photos.append((m.group(1), int(m.group(2)), int(m.group(3)), u))
 
     listing_id = None
     if vehicle_json and vehicle_json.get("image"):
-        m = re.search(r'-(\d{7,8})-\d+-\d+\.jpg', vehicle_json["image"])
+        m = _PHOTO_RE.search(vehicle_json["image"])
         if m:
             listing_id = m.group(1)
-    if not listing_id:
-        for u in raw_photo_urls:
-            m = re.search(r'-(\d{7,8})-\d+-\d+\.jpg', u)
-            if m:
-                listing_id = m.group(1)
-                break
+    if not listing_id and parsed_photos:
+        listing_id = parsed_photos[0][0]
 
     best_per_seq = {}
-    for u in raw_photo_urls:
-        m = re.search(r'-(\d{7,8})-(\d+)-(\d+)\.jpg', u)
-        if not m:
-            continue
-        url_listing = m.group(1)
-        photo_seq = int(m.group(2))
-        resolution = int(m.group(3))
+    for url_listing, photo_seq, resolution, u in parsed_photos:
         if listing_id and url_listing != listing_id:
             continue
         if photo_seq not in best_per_seq or resolution > best_per_seq[photo_seq][0]:
@@ -313,13 +394,6 @@ async def scrape_detail_page(page, detail_url):
 
     photos = [url for _, (_, url) in sorted(best_per_seq.items())]
 
-    title = await page.evaluate("""
-        () => {
-            const h1 = document.querySelector('h1');
-            return h1 ? h1.textContent.trim() : '';
-        }
-    """)
-
     return {
         "json_ld": vehicle_json,
         "specs": specs,
@@ -357,7 +431,7 @@ def build_vehicle_record(listing_ld, detail_data):
         except (ValueError, TypeError):
             pass
     if not record.get("year") and title:
-        m = re.search(r'\b(19|20)\d{2}\b', title)
+        m = _YEAR_RE.search(title)
         if m:
             record["year"] = int(m.group())
 
@@ -369,7 +443,7 @@ def build_vehicle_record(listing_ld, detail_data):
         record["model"] = parts[0] if parts else model_full
         record["trim"] = parts[1] if len(parts) > 1 else ""
     elif title:
-        m = re.match(r'\d{4}\s+(\S+)\s+(\S+)\s*(.*)', title)
+        m = _TITLE_RE.match(title)
         if m:
             record["make"] = record["make"] or m.group(1)
             record["model"] = m.group(2)
@@ -382,7 +456,7 @@ def build_vehicle_record(listing_ld, detail_data):
         price_str = str(offer.get("price", ""))
     if not price_str:
         price_str = specs.get("price", "") or specs.get("our price", "")
-    cleaned = re.sub(r'[^\d.]', '', price_str)
+    cleaned = _NON_DIGIT_DOT_RE.sub('', price_str)
     try:
         record["price"] = float(cleaned) if cleaned else None
     except ValueError:
@@ -393,7 +467,7 @@ def build_vehicle_record(listing_ld, detail_data):
         or specs.get("miles", "")
         or specs.get("mileage", "")
     )
-    cleaned = re.sub(r'[^\d]', '', str(mileage_str))
+    cleaned = _NON_DIGIT_RE.sub('', str(mileage_str))
     try:
         record["mileage"] = int(cleaned) if cleaned else None
     except ValueError:
@@ -446,31 +520,41 @@ def build_vehicle_record(listing_ld, detail_data):
 # Old approach used inpainting which created ugly smeared artifacts.
 # New approach: simple crop — removes the frame strips cleanly.
 
-def has_dealer_frame(img_bytes):
-    """Detect whether image has the Automotive Avenues dealer frame overlay."""
+def has_dealer_frame(img_src):
+    """Detect whether image has the Automotive Avenues dealer frame overlay.
+
+    ``img_src`` is either the JPEG bytes or a path to the file on disk.
+    """
     import numpy as np
     from PIL import Image
     from io import BytesIO
     try:
-        img = Image.open(BytesIO(img_bytes))
-        arr = np.array(img)
-        h, w = arr.shape[:2]
+        img = Image.open(BytesIO(img_src) if isinstance(img_src, bytes) else img_src)
+        w, h = img.size
         if h < 100 or w < 100:
             return False
 
+        # Only coarse white-fraction statistics are needed, so let libjpeg
+        # decode at 1/8 scale (scaled IDCT) instead of full resolution
+        img.draft("RGB", (w // 8, h // 8))
+        arr = np.asarray(img, dtype=np.uint8)
+        h, w = arr.shape[:2]
+
         # Check top-left area for white/bright region (logo background)
-        tl_h, tl_w = int(h * 0.12), int(w * 0.30)
+        tl_h, tl_w = max(int(h * 0.12), 1), max(int(w * 0.30), 1)
         tl = arr[0:tl_h, 0:tl_w, :]
-        tl_white = np.sum(np.all(tl > 230, axis=2)) / (tl_h * tl_w) * 100
+        tl_white = np.count_nonzero(tl.min(axis=2) > 230) / (tl_h * tl_w) * 100
+        if tl_white <= 40:
+            return False
 
         # Check bottom-right area for white/bright region (URL bar)
-        br_h, br_w = int(h * 0.07), int(w * 0.50)
+        br_h, br_w = max(int(h * 0.07), 1), max(int(w * 0.50), 1)
         br = arr[-br_h:, -br_w:, :]
-        br_white = np.sum(np.all(br > 230, axis=2)) / (br_h * br_w) * 100
+        br_white = np.count_nonzero(br.min(axis=2) > 230) / (br_h * br_w) * 100
 
         # Frame is present if BOTH top-left logo area AND bottom URL bar are
         # predominantly white/bright
-        return tl_white > 40 and br_white > 30
+        return br_white > 30
     except Exception:
         return False
 
@@ -501,63 +585,303 @@ def remove_dealer_frame(img_bytes):
         cropped = img.crop((0, top_px, w, h - bot_px))
 
         out = BytesIO()
-        cropped.save(out, format="JPEG", quality=95)
+        # 4:2:0 matches what the CDN serves; no optimize/progressive passes
+        cropped.save(out, format="JPEG", quality=90, subsampling="4:2:0",
+                     optimize=False, progressive=False)
         return out.getvalue()
     except Exception as e:
         print(f"      Frame removal (crop) error: {e}")
         return img_bytes
 
 
+def strip_dealer_frame(fpath, url):
+    """Detect and crop the dealer frame of a downloaded JPEG in place.
+
+    Only photos served from the dealer CDN can carry the frame, so other
+    URLs skip PIL entirely. Detection runs on a 1/8-scale decode straight
+    from the file; the bytes are only read back for the full decode +
+    re-encode when a frame is actually present. Returns True if cropped.
+    """
+    if "ebizautos.media" not in url or not has_dealer_frame(fpath):
+        return False
+    # Swap the cropped copy in so the served photo is never half-written
+    part = fpath.with_suffix(fpath.suffix + ".part")
+    part.write_bytes(remove_dealer_frame(fpath.read_bytes()))
+    os.replace(part, fpath)
+    return True
+
+
 # ── Photo downloader ─────────────────────────────────────────────────────────
 
-async def download_photos(vin, photo_urls):
-    """Download all photos for a vehicle. Returns only local /media/... paths."""
+# One HTTP/2 client for the whole run, so every vehicle's photos multiplex
+# over the same keep-alive connection instead of a new pool + TLS handshake
+# per VIN. Created lazily inside the running loop; closed by main().
+_photo_client: httpx.AsyncClient | None = None
+
+
+def _get_photo_client() -> httpx.AsyncClient:
+    global _photo_client
+    if _photo_client is None:
+        _photo_client = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            headers={
+                "User-Agent": (
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                    "AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36"
+                )
+            },
+        )
+    return _photo_client
+
+
+async def close_photo_client():
+    global _photo_client
+    if _photo_client is not None:
+        await _photo_client.aclose()
+        _photo_client = None
+
+
+# Frame detection/cropping is CPU-bound libjpeg work; running it in worker
+# processes keeps the event loop free to service the other downloads.
+# Created on first use, when aiofiles/executor threads already exist, so
+# workers come from a forkserver rather than forking this threaded process.
+# Shut down by main().
+_image_pool: ProcessPoolExecutor | None = None
+
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(
+            max_workers=(os.cpu_count() or 2) // 2 or 1,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown()
+        _image_pool = None
+
+
+# Dealers reuse stock photography across VINs, and reruns fetch the same
+# photos again. Raw response bytes are hashed, and a photo whose hash was
+# already stored is copied from (or left as) the existing file instead of
+# being re-cropped. Copies, not hard links: other writers (the Celery
+# scraper) rewrite media files in place, which would change every linked
+# VIN's photo at once. Persisted between runs in PHOTO_HASHES_FILE.
+PHOTO_HASHES_FILE = PROGRESS_DIR / "photo_hashes.json"
+_photo_hashes: dict[str, str] = {}     # blake2b digest of raw bytes -> stored path
+_photo_digests: dict[str, str] = {}    # stored path -> digest (to drop stale entries)
+
+
+def _load_photo_hashes():
+    _photo_hashes.clear()
+    _photo_digests.clear()
+    try:
+        _photo_hashes.update(_json_loads(PHOTO_HASHES_FILE.read_bytes()))
+    except (OSError, ValueError):
+        return
+    _photo_digests.update((path, digest) for digest, path in _photo_hashes.items())
+
+
+def _save_photo_hashes():
+    PHOTO_HASHES_FILE.parent.mkdir(exist_ok=True)
+    tmp = PHOTO_HASHES_FILE.with_suffix(".json.tmp")
+    try:
+        tmp.write_bytes(_json_dumps(_photo_hashes))
+        os.replace(tmp, PHOTO_HASHES_FILE)
+    except OSError:
+        pass
+
+
+def _forget_photo(fpath):
+    """Drop the hash entry of whatever used to be stored at ``fpath``."""
+    path = str(fpath)
+    stale = _photo_digests.pop(path, None)
+    if stale and _photo_hashes.get(stale) == path:
+        del _photo_hashes[stale]
+
+
+async def _stream_photo(client, url, vin_dir, idx):
+    """Stream one photo into a ``.part`` file in 64KB chunks.
+
+    Returns ``(fpath, part_path, digest)``: the final path (extension from
+    the content type), the staged download, and the blake2b digest of the
+    raw bytes. Raises ``httpx.HTTPStatusError`` on a non-2xx response,
+    before anything is written.
+    """
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        ct = resp.headers.get("content-type", "")
+        ext = ".jpg"
+        if "png" in ct:
+            ext = ".png"
+        elif "webp" in ct:
+            ext = ".webp"
+
+        fpath = vin_dir / f"{idx+1:03d}{ext}"
+        part = fpath.with_suffix(ext + ".part")
+        h = hashlib.blake2b(digest_size=16)
+        try:
+            async with aiofiles.open(part, "wb") as f:
+                async for chunk in resp.aiter_bytes(65536):
+                    h.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            part.unlink(missing_ok=True)   # don't leave partials in served media
+            raise
+    return fpath, part, h.hexdigest()
+
+
+async def _store_photo(fpath, part, digest, url):
+    """Move a staged download into place, reusing an identical stored photo.
+
+    Returns a status suffix for the progress log.
+    """
+    known = _photo_hashes.get(digest)
+    if known and os.path.exists(known):
+        if known == str(fpath):
+            part.unlink()
+            return " [UNCHANGED]"
+        # Copy over the staged file and swap it in, so readers never see a
+        # missing or half-copied photo
+        _forget_photo(fpath)
+        shutil.copyfile(known, part)
+        os.replace(part, fpath)
+        return " [DUPLICATE]"
+
+    _forget_photo(fpath)
+    os.replace(part, fpath)
+    status = ""
+    # Frame-free photos never touch PIL beyond the scaled probe; the decode
+    # work runs in the image pool so it doesn't stall other downloads
+    if fpath.suffix == ".jpg" and await asyncio.get_running_loop().run_in_executor(
+        _get_image_pool(), strip_dealer_frame, fpath, url,
+    ):
+        status = " [FRAME REMOVED]"
+    _photo_hashes[digest] = str(fpath)
+    _photo_digests[str(fpath)] = digest
+    return status
+
+
+async def download_photos(vin, photo_urls, log=print):
+    """Download all photos for a vehicle. Returns only local /media/... paths.
+
+    Photos are fetched concurrently (at most PHOTO_CONCURRENCY in flight)
+    over the shared HTTP/2 client, so total time tracks the slowest photo
+    rather than the sum of all of them. Per-photo lines go to ``log``.
+    """
     if not photo_urls or not vin:
         return []
     vin_dir = MEDIA_DIR / vin
     vin_dir.mkdir(parents=True, exist_ok=True)
 
-    local_paths = []
-    async with httpx.AsyncClient(
-        timeout=30.0,
-        follow_redirects=True,
-        headers={
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36"
-            )
-        },
-    ) as client:
-        for idx, url in enumerate(photo_urls):
+    total = len(photo_urls)
+    sem = asyncio.Semaphore(PHOTO_CONCURRENCY)
+
+    async def _fetch_one(client, idx, url):
+        async with sem:
+            part = None
             try:
-                hires_url = re.sub(r'-(\d+)\.jpg$', '-1024.jpg', url)
-                resp = await client.get(hires_url)
-                if resp.status_code != 200:
-                    resp = await client.get(url)
-                resp.raise_for_status()
-
-                img_bytes = resp.content
-                ct = resp.headers.get("content-type", "")
-                ext = ".jpg"
-                if "png" in ct:
-                    ext = ".png"
-                elif "webp" in ct:
-                    ext = ".webp"
-
-                frame_status = ""
-                if ext == ".jpg" and has_dealer_frame(img_bytes):
-                    img_bytes = remove_dealer_frame(img_bytes)
-                    frame_status = " [FRAME REMOVED]"
-
-                fname = f"{idx+1:03d}{ext}"
-                fpath = vin_dir / fname
-                fpath.write_bytes(img_bytes)
-                local_paths.append(f"/media/{vin}/{fname}")
-                size_kb = len(img_bytes) // 1024
-                print(f"      [{idx+1}/{len(photo_urls)}] {fname} ({size_kb}KB){frame_status}")
+                hires_url = _HIRES_RE.sub('-1024.jpg', url)
+                try:
+                    fpath, part, digest = await _stream_photo(client, hires_url, vin_dir, idx)
+                except httpx.HTTPStatusError:
+                    fpath, part, digest = await _stream_photo(client, url, vin_dir, idx)
+
+                frame_status = await _store_photo(fpath, part, digest, url)
+
+                fname = fpath.name
+                size_kb = fpath.stat().st_size // 1024
+                log(f"      [{idx+1}/{total}] {fname} ({size_kb}KB){frame_status}")
+                return idx, f"/media/{vin}/{fname}"
             except Exception as e:
-                print(f"      [{idx+1}/{len(photo_urls)}] FAILED: {e}")
-    return local_paths
+                if part is not None:
+                    part.unlink(missing_ok=True)
+                log(f"      [{idx+1}/{total}] FAILED: {e}")
+                return idx, None
+
+    client = _get_photo_client()
+    results = await asyncio.gather(
+        *(_fetch_one(client, idx, url) for idx, url in enumerate(photo_urls)),
+        return_exceptions=True,
+    )
+
+    # gather preserves submission order, so paths stay in photo order
+    return [r[1] for r in results if isinstance(r, tuple) and r[1]]
+
+
+# ── Per-vehicle detail scrape ────────────────────────────────────────────────
+
+async def scrape_vehicle(page, idx, total, listing, errors):
+    """Scrape one listing's detail page and download its photos.
+
+    Returns the vehicle record, or None (with the error recorded) on failure.
+    The vehicle's log block is collected and printed in one piece at the
+    end, so blocks from concurrent detail workers don't interleave.
+    """
+    lines = []
+    log = lines.append
+    try:
+        return await _scrape_vehicle(page, idx, total, listing, errors, log)
+    finally:
+        print("\n".join(lines))
+
+
+async def _scrape_vehicle(page, idx, total, listing, errors, log):
+    detail_url = listing["detail_url"]
+    listing_ld = listing.get("json_ld")
+    vin_hint = listing_ld.get("vehicleIdentificationNumber", "") if listing_ld else ""
+
+    log(f"\n  ┌─ Vehicle {idx+1}/{total} {'─' * 40}")
+    if vin_hint:
+        log(f"  │ VIN hint: {vin_hint}")
+    log(f"  │ URL: {detail_url}")
+
+    try:
+        detail_data = await scrape_detail_page(page, detail_url)
+        record = build_vehicle_record(listing_ld, detail_data)
+
+        if not record.get("vin"):
+            err = f"No VIN found at {detail_url}"
+            log(f"  │ WARNING: {err}")
+            errors.append(err)
+            return None
+
+        vin = record["vin"]
+        log(f"  │ {record.get('year', '?')} {record.get('make', '?')} {record.get('model', '?')} {record.get('trim', '')}")
+        log(f"  │ VIN: {vin}")
+        price = record.get("price")
+        log(f"  │ Price: ${price:,.0f}" if price else "  │ Price: N/A")
+        mil = record.get("mileage")
+        log(f"  │ Mileage: {mil:,}" if mil else "  │ Mileage: N/A")
+
+        remote_photos = record.pop("remote_photos", [])
+        log(f"  │ Photos found: {len(remote_photos)}")
+
+        if remote_photos:
+            log("  │ Downloading photos...")
+            local_paths = await download_photos(vin, remote_photos, log)
+            record["photos"] = local_paths  # only local paths
+            log(f"  │ Downloaded: {len(local_paths)}/{len(remote_photos)}")
+        else:
+            record["photos"] = []
+
+        log("  └─ OK")
+        return record
+
+    except Exception as e:
+        err = f"Error scraping {detail_url}: {e}"
+        log(f"  │ ERROR: {err}")
+        log("  └─ FAILED")
+        errors.append(err)
+        return None
 
 
 # ── Main ─────────────────────────────────────────────────────────────────────
@@ -579,6 +903,7 @@ async def main(task_id: str | None = None, max_pages: int = 1):
 
     # Initialise DB tables (idempotent)
     await init_db()
+    _load_photo_hashes()
 
     # Launch browser
     print("\n[BROWSER] Launching Playwright Chromium...")
@@ -620,62 +945,34 @@ async def main(task_id: str | None = None, max_pages: int = 1):
         print(f"[STEP 2] Scraping {total} detail pages...")
         print("-" * 72)
 
-        for idx, listing in enumerate(listings):
-            detail_url = listing["detail_url"]
-            listing_ld = listing.get("json_ld")
-            vin_hint = listing_ld.get("vehicleIdentificationNumber", "") if listing_ld else ""
-
-            pct = 15 + int((idx / total) * 70)  # 15 -> 85 across vehicles
-            progress.update(
-                progress=pct,
-                message=f"Scraping vehicle {idx+1}/{total}... {vin_hint}",
-            )
-
-            print(f"\n  ┌─ Vehicle {idx+1}/{total} {'─' * 40}")
-            if vin_hint:
-                print(f"  │ VIN hint: {vin_hint}")
-            print(f"  │ URL: {detail_url}")
-
-            delay = random.uniform(2, 4)
-            await asyncio.sleep(delay)
-
-            try:
-                detail_data = await scrape_detail_page(page, detail_url)
-                record = build_vehicle_record(listing_ld, detail_data)
-
-                if not record.get("vin"):
-                    err = f"No VIN found at {detail_url}"
-                    print(f"  │ WARNING: {err}")
-                    errors.append(err)
-                    continue
-
-                vin = record["vin"]
-                print(f"  │ {record.get('year', '?')} {record.get('make', '?')} {record.get('model', '?')} {record.get('trim', '')}")
-                print(f"  │ VIN: {vin}")
-                price = record.get("price")
-                print(f"  │ Price: ${price:,.0f}" if price else "  │ Price: N/A")
-                mil = record.get("mileage")
-                print(f"  │ Mileage: {mil:,}" if mil else "  │ Mileage: N/A")
-
-                remote_photos = record.pop("remote_photos", [])
-                print(f"  │ Photos found: {len(remote_photos)}")
-
-                if remote_photos:
-                    print("  │ Downloading photos...")
-                    local_paths = await download_photos(vin, remote_photos)
-                    record["photos"] = local_paths  # only local paths
-                    print(f"  │ Downloaded: {len(local_paths)}/{len(remote_photos)}")
-                else:
-                    record["photos"] = []
-
-                all_vehicles.append(record)
-                print("  └─ OK")
-
-            except Exception as e:
-                err = f"Error scraping {detail_url}: {e}"
-                print(f"  │ ERROR: {err}")
-                print("  └─ FAILED")
-                errors.append(err)
+        # Fan the listings out over a small pool of pages so several
+        # navigations (and their photo downloads) are in flight at once.
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in enumerate(listings):
+            queue.put_nowait(item)
+        results = [None] * total
+        done = 0
+
+        async def detail_worker(worker_page):
+            nonlocal done
+            while True:
+                try:
+                    idx, listing = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # Concurrency already spaces requests; a short jitter is enough
+                await asyncio.sleep(random.uniform(0.5, 1.0))
+                results[idx] = await scrape_vehicle(worker_page, idx, total, listing, errors)
+                _flush_output()
+                done += 1
+                progress.update(
+                    progress=15 + int((done / total) * 70),  # 15 -> 85 across vehicles
+                    message=f"Scraped vehicle {done}/{total}...",
+                )
+
+        pages = [page] + [await ctx.new_page() for _ in range(min(DETAIL_WORKERS, total) - 1)]
+        await asyncio.gather(*(detail_worker(p) for p in pages))
+        all_vehicles.extend(r for r in results if r)
 
     finally:
         if pw_obj:
@@ -685,13 +982,17 @@ async def main(task_id: str | None = None, max_pages: int = 1):
                 await pw_obj.stop()
             except Exception:
                 pass
+        await close_photo_client()
+        shutdown_image_pool()
+        _save_photo_hashes()
         print("\n[BROWSER] Closed.")
 
     # ── Step 3: Upsert to database ───────────────────────────────────────
+    total_found = len(all_vehicles)
     print("\n" + "-" * 72)
-    print(f"[STEP 3] Saving {len(all_vehicles)} vehicles to database...")
+    print(f"[STEP 3] Saving {total_found} vehicles to database...")
     print("-" * 72)
-    progress.update(progress=88, message="Saving to database...")
+    progress.update(progress=88, message="Saving to database...", force=True)
 
     vehicles_new = 0
     vehicles_updated = 0
@@ -702,60 +1003,83 @@ async def main(task_id: str | None = None, max_pages: int = 1):
         "body_style", "drivetrain", "engine", "transmission",
         "detail_url",
     )
+    get_tracked = operator.attrgetter(*_tracked_fields)
 
-    async with AsyncSessionLocal() as session:
+    # One BEGIN/COMMIT spans every read and write below. Autoflush is off:
+    # all writes are issued explicitly, so the reads never need to flush.
+    async with AsyncSessionLocal() as session, session.begin():
+        session.autoflush = False
         scraped_vins = set()
+        # Rows are collected here and written in bulk after the loop: new and
+        # existing vehicles alike go through one INSERT ... ON CONFLICT(vin)
+        # DO UPDATE per batch, logs through one INSERT per table
+        vehicle_rows: list[dict] = []
+        change_logs: list[dict] = []
+        price_history: list[dict] = []
+
+        # One IN query instead of a SELECT per vehicle. Only the columns the
+        # diff reads are fetched, as plain rows — no ORM objects to hydrate
+        # or track, since all writes go through the bulk statements below.
+        result = await session.execute(
+            select(
+                Vehicle.vin, Vehicle.is_active, Vehicle.photos,
+                *(getattr(Vehicle, field) for field in _tracked_fields),
+            ).where(Vehicle.vin.in_([v["vin"] for v in all_vehicles if v.get("vin")]))
+        )
+        existing_by_vin = {row.vin: row for row in result.all()}
 
         for v in all_vehicles:
             vin = v.get("vin")
-            if not vin:
+            if not vin or vin in scraped_vins:
                 continue
             scraped_vins.add(vin)
 
-            result = await session.execute(
-                select(Vehicle).where(Vehicle.vin == vin)
-            )
-            existing = result.scalar_one_or_none()
+            existing = existing_by_vin.get(vin)
 
             if existing:
                 # ── Detect per-field changes and log them ────────────────
                 changed_fields = []
-                for field in _tracked_fields:
-                    old_val = getattr(existing, field)
-                    new_val = v.get(field)
-                    # Normalize for comparison
-                    old_str = str(old_val) if old_val is not None else ""
-                    new_str = str(new_val) if new_val is not None else ""
-                    if old_str != new_str:
-                        changed_fields.append((field, old_str, new_str))
-                        session.add(VehicleChangeLog(
-                            vin=vin, changed_at=now, change_type="updated",
-                            field_name=field, old_value=old_str, new_value=new_str,
-                            task_id=task_id,
+                new_values = tuple(v.get(field) for field in _tracked_fields)
+                # Reruns mostly see unchanged vehicles: one tuple comparison
+                # settles that before any per-field str() normalisation
+                if get_tracked(existing) != new_values:
+                    for field in _tracked_fields:
+                        old_val = getattr(existing, field)
+                        new_val = v.get(field)
+                        # Normalize for comparison
+                        old_str = str(old_val) if old_val is not None else ""
+                        new_str = str(new_val) if new_val is not None else ""
+                        if old_str != new_str:
+                            changed_fields.append((field, old_str, new_str))
+                            change_logs.append(dict(
+                                vin=vin, changed_at=now, change_type="updated",
+                                field_name=field, old_value=old_str, new_value=new_str,
+                                task_id=task_id,
+                            ))
+
+                    # If price changed, also record in price history
+                    old_price = existing.price
+                    new_price = v.get("price")
+                    if str(old_price or "") != str(new_price or ""):
+                        price_history.append(dict(
+                            vin=vin, price=new_price, recorded_at=now, source="scrape",
                         ))
 
-                # If price changed, also record in price history
-                old_price = existing.price
-                new_price = v.get("price")
-                if str(old_price or "") != str(new_price or ""):
-                    session.add(VehiclePriceHistory(
-                        vin=vin, price=new_price, recorded_at=now, source="scrape",
-                    ))
-
                 # Was inactive, now back? Log reactivation
                 if not existing.is_active:
-                    session.add(VehicleChangeLog(
+                    change_logs.append(dict(
                         vin=vin, changed_at=now, change_type="reactivated",
                         field_name="is_active", old_value="False", new_value="True",
                         task_id=task_id,
                     ))
 
-                # Apply all field updates
-                for field in _tracked_fields:
-                    setattr(existing, field, v.get(field))
-                existing.photos = v.get("photos", existing.photos)
-                existing.is_active = True
-                existing.updated_at = now
+                vehicle_rows.append({
+                    "vin": vin,
+                    **dict(zip(_tracked_fields, new_values, strict=True)),
+                    "photos": v.get("photos", existing.photos),
+                    "is_active": True,
+                    "updated_at": now,
+                })
                 vehicles_updated += 1
 
                 if changed_fields:
@@ -765,61 +1089,73 @@ async def main(task_id: str | None = None, max_pages: int = 1):
                     print(f"  Updated: {vin} (no data changes)")
             else:
                 # ── New vehicle ──────────────────────────────────────────
-                session.add(Vehicle(
-                    vin=vin,
-                    stock_number=v.get("stock_number"),
-                    year=v.get("year"),
-                    make=v.get("make"),
-                    model=v.get("model"),
-                    trim=v.get("trim"),
-                    price=v.get("price"),
-                    mileage=v.get("mileage"),
-                    exterior_color=v.get("exterior_color"),
-                    interior_color=v.get("interior_color"),
-                    body_style=v.get("body_style"),
-                    drivetrain=v.get("drivetrain"),
-                    engine=v.get("engine"),
-                    transmission=v.get("transmission"),
-                    photos=v.get("photos", []),
-                    detail_url=v.get("detail_url"),
-                    is_active=True,
-                ))
-                session.add(VehicleChangeLog(
+                vehicle_rows.append({
+                    "vin": vin,
+                    **{field: v.get(field) for field in _tracked_fields},
+                    "photos": v.get("photos", []),
+                    "is_active": True,
+                    "updated_at": now,
+                })
+                change_logs.append(dict(
                     vin=vin, changed_at=now, change_type="new",
                     field_name=None, old_value=None, new_value=None,
                     task_id=task_id,
                 ))
                 if v.get("price") is not None:
-                    session.add(VehiclePriceHistory(
+                    price_history.append(dict(
                         vin=vin, price=v.get("price"), recorded_at=now, source="scrape",
                     ))
                 vehicles_new += 1
                 print(f"  New: {vin}")
 
-        # Mark vehicles no longer on the page as inactive
-        vehicles_removed = 0
-        all_result = await session.execute(
-            select(Vehicle).where(Vehicle.is_active == True)  # noqa: E712
+        # Mark vehicles no longer on the page as inactive: fetch just their
+        # VINs, then flip them all with a single UPDATE
+        gone_result = await session.execute(
+            select(Vehicle.vin).where(
+                Vehicle.is_active == True,  # noqa: E712
+                Vehicle.vin.not_in(scraped_vins),
+            )
         )
-        for veh in all_result.scalars().all():
-            if veh.vin not in scraped_vins:
-                veh.is_active = False
-                session.add(VehicleChangeLog(
-                    vin=veh.vin, changed_at=now, change_type="removed",
-                    field_name="is_active", old_value="True", new_value="False",
-                    task_id=task_id,
-                ))
-                vehicles_removed += 1
+        gone_vins = gone_result.scalars().all()
+        if gone_vins:
+            await session.execute(
+                update(Vehicle)
+                .where(Vehicle.vin.in_(gone_vins))
+                .values(is_active=False, updated_at=now)
+            )
+        change_logs.extend(
+            dict(
+                vin=gone_vin, changed_at=now, change_type="removed",
+                field_name="is_active", old_value="True", new_value="False",
+                task_id=task_id,
+            )
+            for gone_vin in gone_vins
+        )
+        vehicles_removed = len(gone_vins)
+
+        upsert_cols = (*_tracked_fields, "photos", "is_active", "updated_at")
+        for start in range(0, len(vehicle_rows), UPSERT_BATCH_SIZE):
+            stmt = upsert_insert(Vehicle).values(vehicle_rows[start:start + UPSERT_BATCH_SIZE])
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=["vin"],
+                set_={col: stmt.excluded[col] for col in upsert_cols},
+            ))
+        if change_logs:
+            await session.execute(insert(VehicleChangeLog), change_logs)
+        if price_history:
+            await session.execute(insert(VehiclePriceHistory), price_history)
 
         # ── Write / update the ScrapeLog row ──────────────────────────────
         elapsed = time.time() - start_time
         log_msg = (
             f"Scrape completed in {elapsed:.0f}s. "
-            f"{len(all_vehicles)} vehicles found, "
+            f"{total_found} vehicles found, "
             f"{vehicles_new} new, {vehicles_updated} updated, "
             f"{vehicles_removed} removed."
         )
 
+        # One timestamp for whichever log row gets written
+        finished_at = datetime.now(timezone.utc)
         if task_id:
             # Update the ScrapeLog row that the API already created
             log_result = await session.execute(
@@ -828,8 +1164,8 @@ async def main(task_id: str | None = None, max_pages: int = 1):
             log_row = log_result.scalar_one_or_none()
             if log_row:
                 log_row.status = ScrapeStatus.COMPLETED
-                log_row.finished_at = datetime.now(timezone.utc)
-                log_row.vehicles_found = len(all_vehicles)
+                log_row.finished_at = finished_at
+                log_row.vehicles_found = total_found
                 log_row.vehicles_new = vehicles_new
                 log_row.vehicles_updated = vehicles_updated
                 log_row.vehicles_removed = vehicles_removed
@@ -840,8 +1176,8 @@ async def main(task_id: str | None = None, max_pages: int = 1):
                 session.add(ScrapeLog(
                     task_id=task_id,
                     status=ScrapeStatus.COMPLETED,
-                    finished_at=datetime.now(timezone.utc),
-                    vehicles_found=len(all_vehicles),
+                    finished_at=finished_at,
+                    vehicles_found=total_found,
                     vehicles_new=vehicles_new,
                     vehicles_updated=vehicles_updated,
                     vehicles_removed=vehicles_removed,
@@ -853,8 +1189,8 @@ async def main(task_id: str | None = None, max_pages: int = 1):
             session.add(ScrapeLog(
                 task_id=f"manual-{int(time.time())}",
                 status=ScrapeStatus.COMPLETED,
-                finished_at=datetime.now(timezone.utc),
-                vehicles_found=len(all_vehicles),
+                finished_at=finished_at,
+                vehicles_found=total_found,
                 vehicles_new=vehicles_new,
                 vehicles_updated=vehicles_updated,
                 vehicles_removed=vehicles_removed,
@@ -862,14 +1198,16 @@ async def main(task_id: str | None = None, max_pages: int = 1):
                 log_output=log_msg,
             ))
 
-        await session.commit()
-        print(f"  => Committed to DB. New={vehicles_new}, Updated={vehicles_updated}, Removed={vehicles_removed}")
+        await session.flush()
+
+    print(f"  => Committed to DB. New={vehicles_new}, Updated={vehicles_updated}, Removed={vehicles_removed}")
+    _flush_output()
 
     # ── Final progress update ────────────────────────────────────────────
     progress.update(
         status="completed",
         progress=100,
-        vehicles_found=len(all_vehicles),
+        vehicles_found=total_found,
         vehicles_new=vehicles_new,
         vehicles_updated=vehicles_updated,
         message=log_msg,
@@ -877,13 +1215,13 @@ async def main(task_id: str | None = None, max_pages: int = 1):
 
     elapsed = time.time() - start_time
     total_local = sum(
-        len([p for p in v.get("photos", []) if p.startswith("/media")])
-        for v in all_vehicles
+        1 for v in all_vehicles for p in v.get("photos", ()) if p.startswith(LOCAL_PREFIXES)
     )
     print(f"\n{'=' * 72}")
-    print(f"  SCRAPE COMPLETE — {len(all_vehicles)} vehicles, {len(errors)} errors, {elapsed:.1f}s")
+    print(f"  SCRAPE COMPLETE — {total_found} vehicles, {len(errors)} errors, {elapsed:.1f}s")
     print(f"  Photos downloaded: {total_local}")
     print(f"{'=' * 72}")
+    _flush_output()
 
 
 # ── CLI entry point ──────────────────────────────────────────────────────────
@@ -894,6 +1232,11 @@ if __name__ == "__main__":
     parser.add_argument("--pages", default="1", help="Pages to scrape: 1, N, or 0 for all")
     args = parser.parse_args()
 
+    # Each vehicle prints a dozen-plus lines; on a terminal line buffering
+    # turns every one into a write. Buffer instead and flush explicitly at
+    # page/vehicle boundaries (see _flush_output call sites).
+    sys.stdout.reconfigure(line_buffering=False)
+
     try:
         max_pages = int(args.pages)
     except ValueError:
@@ -902,37 +1245,41 @@ if __name__ == "__main__":
     try:
         asyncio.run(main(task_id=args.task_id, max_pages=max_pages))
     except Exception:
+        tb = traceback.format_exc()
         # If launched with a task_id, write a failure progress file so the
         # frontend shows the error instead of spinning forever.
         if args.task_id:
-            fail_path = PROGRESS_DIR / f"{args.task_id}.json"
-            fail_path.write_text(json.dumps({
-                "task_id": args.task_id,
-                "status": "failed",
-                "progress": 0,
-                "vehicles_found": 0,
-                "vehicles_new": 0,
-                "vehicles_updated": 0,
-                "current_page": 0,
-                "total_pages": 0,
-                "message": f"Scraper crashed: {traceback.format_exc()[-300:]}",
-            }))
+            # ProgressWriter swaps the file in atomically, so the poller
+            # never sees a torn document; "failed" always flushes
+            ProgressWriter(args.task_id).update(
+                status="failed",
+                current_page=0,
+                total_pages=0,
+                message=f"Scraper crashed: {tb[-300:]}",
+            )
 
             # Also update the DB row
             try:
                 import sqlite3
+                from contextlib import closing
                 db_path = Path("autoavenue.db")
                 if db_path.exists():
-                    conn = sqlite3.connect(str(db_path))
-                    conn.execute(
-                        "UPDATE scrape_logs SET status = 'FAILED', "
-                        "log_output = ? WHERE task_id = ?",
-                        (f"Crashed: {traceback.format_exc()[-500:]}", args.task_id),
-                    )
-                    conn.commit()
-                    conn.close()
+                    # Autocommit: the single UPDATE needs no BEGIN/COMMIT
+                    # pair, and closing() releases the handle even on error
+                    with closing(sqlite3.connect(
+                        str(db_path), isolation_level=None, timeout=2.0,
+                    )) as conn:
+                        # Match the engine's journal mode so this write
+                        # doesn't block readers of the live database
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute(
+                            "UPDATE scrape_logs SET status = 'FAILED', "
+                            "log_output = ? WHERE task_id = ?",
+                            (f"Crashed: {tb[-500:]}", args.task_id),
+                        )
             except Exception:
                 pass
 
+        _flush_output()   # keep buffered stdout ahead of the traceback
         traceback.print_exc()
         sys.exit(1)
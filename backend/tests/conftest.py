@@ -0,0 +1,22 @@
+"""Shared test setup — the app runs against a shared-cache in-memory SQLite."""
+
+import os
+
+# Must be set before anything imports app.config. cache=shared lets every
+# pooled connection see the same in-memory database instead of each
+# getting a private empty one; the PRAGMA listener skips memory URLs.
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///file::memory:?cache=shared&uri=true"
+
+import pytest_asyncio  # noqa: E402
+
+from app.database import async_engine, init_db  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session", autouse=True)
+async def database():
+    # A shared-cache memory database is dropped when its last connection
+    # closes, so hold one open for the whole run
+    async with async_engine.connect():
+        await init_db()
+        yield
+    await async_engine.dispose()
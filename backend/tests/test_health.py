@@ -1,26 +1,29 @@
 """Smoke tests — verifies the app starts and core endpoints respond."""
 
 import pytest
+import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 
 from app.main import app
 
+# One event loop and one client for the whole run — every test shares the
+# transport instead of building its own
+pytestmark = pytest.mark.asyncio(loop_scope="session")
 
-@pytest.fixture
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def client():
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as c:
         yield c
 
 
-@pytest.mark.asyncio
 async def test_health(client):
     r = await client.get("/health")
     assert r.status_code == 200
     assert r.json()["status"] == "healthy"
 
 
-@pytest.mark.asyncio
 async def test_vehicles_list(client):
     r = await client.get("/api/vehicles")
     assert r.status_code == 200
@@ -29,7 +32,6 @@ async def test_vehicles_list(client):
     assert "total" in data
 
 
-@pytest.mark.asyncio
 async def test_stats(client):
     r = await client.get("/api/stats")
     assert r.status_code == 200
@@ -0,0 +1,137 @@
+"""Parser tests — pure-function cases are parametrized, one test per helper."""
+
+import functools
+
+import pytest
+
+from app.scraper.parser import (
+    _parse_number,
+    _parse_price,
+    _parse_vehicle_title,
+    parse_listing_page,
+    parse_vehicle_detail,
+)
+
+
+# Samples and their parses are built on first use and memoised, so test
+# selections that never touch them (e.g. -k parse_price) skip the work.
+@functools.cache
+def sample_listing_html() -> str:
+    return """<html><body>
+<div class="vehicle-card"><a href="/vehicle/1"><img src="https://cdn.example.com/1.jpg"></a>
+  <h3>2021 Honda Accord Sport</h3></div>
+<div class="vehicle-card"><a href="/vehicle/2"><img data-src="https://cdn.example.com/2.jpg"></a>
+  <h3>2019 BMW X5 xDrive40i</h3></div>
+<div class="vehicle-card"><span>No link here</span></div>
+</body></html>"""
+
+
+@functools.cache
+def sample_detail_html() -> str:
+    return """<html><body>
+<h1>2021 Honda Accord Sport 2.0T</h1>
+<table>
+  <tr><th>VIN</th><td>1HGCV2F34MA000001</td></tr>
+  <tr><th>Stock #</th><td>A1234</td></tr>
+  <tr><th>Price</th><td>$28,995</td></tr>
+  <tr><th>Mileage</th><td>12,345 miles</td></tr>
+  <tr><th>Exterior Color</th><td>Platinum White</td></tr>
+  <tr><th>Transmission</th><td>10-Speed Automatic</td></tr>
+</table>
+<div class="gallery">
+  <img src="//cdn.example.com/p1.jpg">
+  <img src="https://cdn.example.com/p2.jpg">
+  <img src="https://cdn.example.com/p1.jpg">
+</div>
+</body></html>"""
+
+
+@functools.cache
+def listing_stubs() -> list:
+    return parse_listing_page(sample_listing_html())
+
+
+@functools.cache
+def detail_data() -> dict:
+    return parse_vehicle_detail(sample_detail_html(), "http://example.com/vehicle/1")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$28,995", 28995.0),
+    ("$28,995.99", 28995.99),
+    ("28995", 28995.0),
+    ("$0", None),
+    (None, None),
+    ("", None),
+    ("Call for price", None),
+])
+def test_parse_price(text, expected):
+    assert _parse_price(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12,345 miles", 12345),
+    ("0", 0),
+    ("N/A", None),
+    (None, None),
+    ("", None),
+])
+def test_parse_number(text, expected):
+    assert _parse_number(text) == expected
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("2021 Honda Accord Sport 2.0T",
+     {"year": 2021, "make": "Honda", "model": "Accord", "trim": "Sport 2.0T"}),
+    ("  2019 BMW X5  ", {"year": 2019, "make": "BMW", "model": "X5"}),
+    ("2020 Ford", {"year": 2020, "make": "Ford"}),
+    ("Tesla Model 3", {"make": "Tesla", "model": "Model", "trim": "3"}),
+    ("", {}),
+])
+def test_parse_vehicle_title(title, expected):
+    assert _parse_vehicle_title(title) == expected
+
+
+def test_listing_skips_cards_without_links():
+    assert [v["detail_url"] for v in listing_stubs()] == ["/vehicle/1", "/vehicle/2"]
+
+
+def test_listing_thumbnail_falls_back_to_data_src():
+    assert listing_stubs()[1]["thumbnail"] == "https://cdn.example.com/2.jpg"
+
+
+def test_listing_titles():
+    assert listing_stubs()[0]["title"] == "2021 Honda Accord Sport"
+
+
+def test_detail_title_and_specs():
+    data = detail_data()
+    assert data["detail_url"] == "http://example.com/vehicle/1"
+    assert (data["year"], data["make"], data["model"]) == (2021, "Honda", "Accord")
+    assert data["trim"] == "Sport 2.0T"
+    assert data["vin"] == "1HGCV2F34MA000001"
+    assert data["stock_number"] == "A1234"
+    assert data["price"] == 28995.0
+    assert data["mileage"] == 12345
+    assert data["exterior_color"] == "Platinum White"
+    assert data["transmission"] == "10-Speed Automatic"
+
+
+def test_detail_photos_normalized_and_deduplicated():
+    assert detail_data()["photos"] == [
+        "https://cdn.example.com/p1.jpg",
+        "https://cdn.example.com/p2.jpg",
+    ]
+
+
+def test_filters_out_logos_and_icons():
+    html = """<html><body>
+    <img src="/img/logo.png"><img src="/img/icon-phone.svg">
+    <img src="https://cdn.example.com/car.jpg"><img src="/spacer.gif">
+    </body></html>"""
+    assert parse_vehicle_detail(html)["photos"] == ["https://cdn.example.com/car.jpg"]
+
+
+def test_vin_regex_fallback():
+    html = "<html><body><p>Great truck. 1FTEW1EP5LFA00001 is the VIN.</p></body></html>"
+    assert parse_vehicle_detail(html)["vin"] == "1FTEW1EP5LFA00001"
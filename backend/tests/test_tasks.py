@@ -0,0 +1,77 @@
+"""Celery task tests — the scraper is stubbed, the database is the shared in-memory one."""
+
+import asyncio
+import sys
+import types
+
+import pytest
+
+from app import tasks
+
+
+class FakeScraper:
+    """Mimics AutoAvenueScaper: the browser is stopped in the generator's finally."""
+
+    instances = []
+
+    def __init__(self, progress_callback=None):
+        self.errors = []
+        self.browser_stopped = False
+        FakeScraper.instances.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def stop_browser(self):
+        self.browser_stopped = True
+
+    async def download_vehicle_images(self, vin, photo_urls):
+        return []
+
+    async def scrape_inventory(self):
+        try:
+            for page in range(3):
+                yield [{"vin": f"TESTVIN{page:010d}", "make": "Honda", "photos": []}]
+        finally:
+            await self.stop_browser()
+
+
+@pytest.fixture
+def fake_scraper(monkeypatch):
+    module = types.ModuleType("app.scraper.scraper")
+    module.AutoAvenueScaper = FakeScraper
+    monkeypatch.setitem(sys.modules, "app.scraper.scraper", module)
+    monkeypatch.setattr(tasks, "_update_progress", lambda *args, **kwargs: None)
+    monkeypatch.setattr(tasks, "SYNC_BATCH_SIZE", 1)
+    FakeScraper.instances.clear()
+    # run_scrape installs (and closes) its own event loop; put the session's back
+    previous_loop = asyncio.get_event_loop_policy().get_event_loop()
+    yield FakeScraper
+    asyncio.set_event_loop(previous_loop)
+
+
+def test_run_scrape_stops_browser_when_sync_fails(fake_scraper, monkeypatch):
+    def broken_upsert(*args):
+        raise RuntimeError("upsert failed")
+
+    monkeypatch.setattr(tasks, "_upsert_vehicles", broken_upsert)
+    with pytest.raises(RuntimeError, match="upsert failed"):
+        tasks.run_scrape.apply(throw=True)
+    assert [s.browser_stopped for s in fake_scraper.instances] == [True]
+
+
+def test_upsert_drops_unchanged_price_with_cents_before_writing(monkeypatch):
+    vehicle = {"vin": "TESTVINCENTS00001", "make": "Honda", "price": 28995.99, "photos": []}
+    with tasks.SyncSessionLocal() as db:
+        assert tasks._upsert_vehicles(db, [dict(vehicle)], set()) == (1, 0)
+        db.commit()
+
+        # The snapshot compare must filter the row out; no upsert is built
+        def no_upsert(table):
+            raise AssertionError("unchanged row reached the upsert")
+
+        monkeypatch.setattr(tasks, "upsert_insert", no_upsert)
+        assert tasks._upsert_vehicles(db, [dict(vehicle)], set()) == (0, 0)
@@ -1,28 +1,79 @@
 """Simple static file server for the frontend production build."""
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+
 import uvicorn
 from starlette.applications import Starlette
+from starlette.middleware.gzip import GZipMiddleware
 from starlette.routing import Mount
 from starlette.staticfiles import StaticFiles
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, Response
+
+DIST = Path("dist")
 
 app = Starlette()
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+
+# index.html and the favicon are fixed for a given build, so read them once
+# and serve from memory instead of an open/stat/sendfile per request. The
+# ETag lets browsers revalidate with a 304 instead of re-downloading.
+def _load(name):
+    body = (DIST / name).read_bytes()
+    return body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+_INDEX, _INDEX_ETAG = _load("index.html")
+_FAVICON, _FAVICON_ETAG = _load("favicon.svg")
+
+
+def _cached_response(request, body, etag, media_type):
+    headers = {"etag": etag, "cache-control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Vite content-hashes asset names, so a URL never changes content and
+    browsers can cache it for a year without revalidating. A precompressed
+    ``.br`` sibling, if the build produced one, is sent as-is to clients
+    that accept Brotli; everything else falls through to GZipMiddleware."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        accept = dict(scope["headers"]).get(b"accept-encoding", b"")
+        br_path = f"{full_path}.br"
+        if b"br" in accept and os.path.isfile(br_path):
+            response = FileResponse(
+                br_path,
+                status_code=status_code,
+                media_type=mimetypes.guess_type(str(full_path))[0],
+                headers={"content-encoding": "br", "vary": "Accept-Encoding"},
+            )
+        else:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["cache-control"] = "public, max-age=31536000, immutable"
+        return response
+
 
 # Serve static assets
-app.mount("/assets", StaticFiles(directory="dist/assets"), name="assets")
+app.mount("/assets", ImmutableStaticFiles(directory="dist/assets"), name="assets")
 
 # Serve favicon
 @app.route("/favicon.svg")
 async def favicon(request):
-    return FileResponse("dist/favicon.svg")
+    return _cached_response(request, _FAVICON, _FAVICON_ETAG, "image/svg+xml")
 
 # SPA fallback: return index.html for all other routes
 @app.route("/{path:path}")
 async def spa(request):
-    return FileResponse("dist/index.html")
+    return _cached_response(request, _INDEX, _INDEX_ETAG, "text/html")
 
 @app.route("/")
 async def root(request):
-    return FileResponse("dist/index.html")
+    return _cached_response(request, _INDEX, _INDEX_ETAG, "text/html")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5273)